@@ -4,6 +4,7 @@ Pokemon Market Indexes v2 - Configuration
 Centralizes all project configuration.
 """
 
+import math
 import os
 from dotenv import load_dotenv
 
@@ -71,7 +72,8 @@ INDEX_CONFIG = {
 
 # Rarities considered as "Rare" or higher
 # Based on actual data from PokemonPriceTracker API
-RARE_RARITIES = [
+# frozenset: only used for membership checks (hashed lookup, immutable)
+RARE_RARITIES = frozenset({
     # Standard Rares
     "Rare",                         # 3164 cards
     "Holo Rare",                    # 1845 cards
@@ -106,7 +108,7 @@ RARE_RARITIES = [
     
     # Special Collections
     "Classic Collection",           # 129 cards
-]
+})
 
 # EXCLUDED rarities (non-collectibles or low value):
 # - Common (6257)
@@ -129,6 +131,15 @@ CONDITION_WEIGHTS = {
     "Damaged": 0.20,          # Very low
 }
 
+# Condition order used for per-condition columns (nm, lp, mp, hp, dmg)
+CONDITION_ORDER = (
+    "Near Mint",
+    "Lightly Played",
+    "Moderately Played",
+    "Heavily Played",
+    "Damaged",
+)
+
 # Cap for liquidity normalization (based on actual market data analysis)
 # Median listings = 72, p90 = 1112 -> cap at 50 for good discrimination
 LIQUIDITY_CAP = 50  # 50 weighted listings = max score (1.0)
@@ -199,8 +210,48 @@ OUTLIER_RULES = {
 # Validation
 # ============================================================
 
+def _weights_sum_to_one(weights: dict) -> bool:
+    """True if all weights are numbers summing to 1.0 (float tolerance)."""
+    values = list(weights.values())
+    return all(isinstance(v, (int, float)) for v in values) and math.isclose(sum(values), 1.0)
+
+
+def get_config_errors() -> list:
+    """
+    Checks types and invariants of the tunables defined above.
+
+    Returns:
+        list: One "FIELD.path: problem" message per error (empty if valid)
+    """
+    errors = []
+
+    for code, cfg in INDEX_CONFIG.items():
+        size = cfg.get("size")
+        if size is not None and (type(size) is not int or size <= 0):
+            errors.append(f"INDEX_CONFIG.{code}.size: expected positive int or None, got {size!r}")
+
+        maturity_days = cfg.get("maturity_days")
+        if type(maturity_days) is not int or maturity_days < 0:
+            errors.append(f"INDEX_CONFIG.{code}.maturity_days: expected int >= 0, got {maturity_days!r}")
+
+        if cfg.get("type") != "card":
+            errors.append(f"INDEX_CONFIG.{code}.type: expected 'card', got {cfg.get('type')!r}")
+
+    if not _weights_sum_to_one(LIQUIDITY_WEIGHTS):
+        errors.append("LIQUIDITY_WEIGHTS: weights must be numbers summing to 1.0")
+
+    for asset, weights in PRICE_WEIGHTS.items():
+        if not _weights_sum_to_one(weights):
+            errors.append(f"PRICE_WEIGHTS.{asset}: weights must be numbers summing to 1.0")
+
+    if not 0 <= OUTLIER_RULES["min_price"] < OUTLIER_RULES["max_price"]:
+        errors.append("OUTLIER_RULES: expected 0 <= min_price < max_price")
+
+    return errors
+
+
 def validate_config():
-    """Verifies that all configuration is present."""
+    """Verifies that all configuration is present and consistent."""
     errors = []
     
     if not SUPABASE_URL:
@@ -212,5 +263,9 @@ def validate_config():
     
     if errors:
         raise ValueError(f"Incomplete configuration: {', '.join(errors)}")
+
+    errors = get_config_errors()
+    if errors:
+        raise ValueError(f"Invalid configuration: {'; '.join(errors)}")
     
     return True
@@ -21,19 +21,26 @@ Usage:
 import sys
 import os
 import argparse
+import heapq
+import math
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date, timedelta
 from decimal import Decimal, ROUND_HALF_UP
+from functools import lru_cache
+from operator import itemgetter
 
 # Local imports
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from scripts.utils import (
-    get_db_client, batch_upsert,
+    get_db_client, batch_upsert, fetch_all_keyset,
     log_run_start, log_run_end, send_discord_notification, get_today,
     print_header, print_step, print_success, print_error,
-    calculate_liquidity_smart, get_volume_stats_30d
+    calculate_liquidity_smart, get_volume_stats_30d, prefetch_volume_history
 )
 from config.settings import INDEX_CONFIG, RARE_RARITIES, OUTLIER_RULES, MIN_AVG_VOLUME_30D
 
+INDEX_CODES = ["RARE_100", "RARE_500", "RARE_5000"]
+
 
 # =============================================================================
 # HELPER FUNCTIONS
@@ -69,14 +76,20 @@ def get_index_price_date(client) -> str:
     return get_latest_price_date(client)
 
 
+@lru_cache(maxsize=1)
 def get_current_month() -> str:
-    """Return the first day of the current month."""
+    """
+    Return the first day of the current month.
+
+    Cached so the whole run uses one month, even if it crosses midnight.
+    """
     return date.today().replace(day=1).strftime("%Y-%m-%d")
 
 
+@lru_cache(maxsize=1)
 def get_previous_month() -> str:
-    """Return the first day of the previous month."""
-    first_of_current = date.today().replace(day=1)
+    """Return the first day of the month before get_current_month()."""
+    first_of_current = date.fromisoformat(get_current_month())
     last_of_previous = first_of_current - timedelta(days=1)
     return last_of_previous.replace(day=1).strftime("%Y-%m-%d")
 
@@ -89,103 +102,52 @@ def get_cards_with_prices(client, price_date: str) -> list:
     """
     Get all cards with their NM prices for the specified date.
     Uses nm_price as reference (Near Mint = our standard).
-    Paginates to retrieve all data (Supabase limits to 1000).
-    
-    Includes volume and listings data for smart liquidity calculation.
-    """
-    # Get ALL prices for the day with pagination
-    all_prices = []
-    offset = 0
-    limit = 1000
-    
-    while True:
-        response = client.from_("card_prices_daily") \
-            .select("card_id, market_price, nm_price, nm_listings, lp_listings, mp_listings, hp_listings, dmg_listings, total_listings, daily_volume, liquidity_score") \
-            .eq("price_date", price_date) \
-            .not_.is_("nm_price", "null") \
-            .range(offset, offset + limit - 1) \
-            .execute()
-        
-        if not response.data:
-            break
-        
-        all_prices.extend(response.data)
-        
-        if len(response.data) < limit:
-            break
-        
-        offset += limit
-    
-    prices_by_card = {p["card_id"]: p for p in all_prices}
-    
-    # Get ALL eligible cards with pagination
-    all_cards = []
-    offset = 0
-
-    while True:
-        response = client.from_("cards") \
-            .select("card_id, name, set_id, rarity, is_eligible, release_date") \
-            .eq("is_eligible", True) \
-            .range(offset, offset + limit - 1) \
-            .execute()
-
-        if not response.data:
-            break
-
-        all_cards.extend(response.data)
-
-        if len(response.data) < limit:
-            break
-
-        offset += limit
+    Paginates by card_id to retrieve all data (Supabase limits to 1000).
 
-    # Also get set release dates for cards without release_date
-    set_ids = list(set(c.get("set_id") for c in all_cards if c.get("set_id")))
-    sets_response = client.from_("sets") \
-        .select("set_id, release_date") \
-        .in_("set_id", set_ids) \
-        .execute()
+    Reads the v_cards_with_prices view (sql/create_v_cards_with_prices.sql):
+    eligible cards joined with the day's prices server-side, release date
+    already falling back to the set's.
 
-    sets_release_dates = {s["set_id"]: s.get("release_date") for s in (sets_response.data or [])}
+    Includes volume and listings data for smart liquidity calculation.
+    """
+    # Get ALL priced eligible cards for the day (keyset pagination on card_id)
+    rows = fetch_all_keyset(
+        lambda: client.from_("v_cards_with_prices")
+            .select("card_id, name, set_id, rarity, release_date, market_price, nm_price, nm_listings, lp_listings, mp_listings, hp_listings, dmg_listings, total_listings, daily_volume, liquidity_score")
+            .eq("price_date", price_date)
+            .not_.is_("nm_price", "null"),
+        "card_id",
+    )
 
-    # Merge - use nm_price as reference price
     result = []
-    for card in all_cards:
-        card_id = card["card_id"]
-        if card_id in prices_by_card:
-            price_data = prices_by_card[card_id]
-
-            # Reference price = NM price (Near Mint)
-            ref_price = price_data.get("nm_price") or price_data.get("market_price")
-
-            if ref_price and ref_price > 0:
-                # Get release date: card's own date, or fallback to set's date
-                card_release_date = card.get("release_date")
-                if not card_release_date:
-                    card_release_date = sets_release_dates.get(card.get("set_id"))
-
-                result.append({
-                    "card_id": card_id,
-                    "name": card["name"],
-                    "set_id": card["set_id"],
-                    "rarity": card["rarity"],
-                    "release_date": card_release_date,
-                    "price": float(ref_price),  # NM price
-                    "market_price": float(price_data.get("market_price") or ref_price),
-                    "liquidity_score": float(price_data.get("liquidity_score") or 0),
-                    "daily_volume": price_data.get("daily_volume"),
-                    "nm_listings": int(price_data.get("nm_listings") or 0),
-                    "lp_listings": int(price_data.get("lp_listings") or 0),
-                    "mp_listings": int(price_data.get("mp_listings") or 0),
-                    "hp_listings": int(price_data.get("hp_listings") or 0),
-                    "dmg_listings": int(price_data.get("dmg_listings") or 0),
-                    "total_listings": int(price_data.get("total_listings") or 0),
-                })
+    for row in rows:
+        # Reference price = NM price (Near Mint)
+        ref_price = row.get("nm_price") or row.get("market_price")
+
+        if ref_price and ref_price > 0:
+            result.append({
+                "card_id": row["card_id"],
+                "name": row["name"],
+                "set_id": row["set_id"],
+                "rarity": row["rarity"],
+                "release_date": row.get("release_date"),
+                "price": float(ref_price),  # NM price
+                "market_price": float(row.get("market_price") or ref_price),
+                "liquidity_score": float(row.get("liquidity_score") or 0),
+                "daily_volume": row.get("daily_volume"),
+                "nm_listings": int(row.get("nm_listings") or 0),
+                "lp_listings": int(row.get("lp_listings") or 0),
+                "mp_listings": int(row.get("mp_listings") or 0),
+                "hp_listings": int(row.get("hp_listings") or 0),
+                "dmg_listings": int(row.get("dmg_listings") or 0),
+                "total_listings": int(row.get("total_listings") or 0),
+            })
 
     return result
 
 
-def get_prices_for_date(client, card_ids: list, price_date: str, use_forward_fill: bool = True) -> dict:
+def get_prices_for_date(client, card_ids: list, price_date: str, use_forward_fill: bool = True,
+                        max_workers: int = 8, cache: dict = None) -> dict:
     """
     Get NM prices for a list of cards at a given date.
 
@@ -194,11 +156,18 @@ def get_prices_for_date(client, card_ids: list, price_date: str, use_forward_fil
     This ensures the index always has 100 constituents.
     Cards with stale prices will be naturally rebalanced at the next monthly rebalancing.
 
+    Queries are independent, so they run concurrently on a small thread pool.
+
     Args:
         client: Supabase client
         card_ids: List of card IDs to get prices for
         price_date: Target date (YYYY-MM-DD)
         use_forward_fill: If True, fallback to last known price (default True)
+        max_workers: Number of concurrent queries
+        cache: Optional dict shared between calls. Holds the exact-date
+            price under (card_id, price_date) and the last known price under
+            (card_id, price_date, "last_known"), None when there is none.
+            Only cards missing from it are queried.
 
     Returns:
         dict: {card_id: price}
@@ -206,51 +175,95 @@ def get_prices_for_date(client, card_ids: list, price_date: str, use_forward_fil
     if not card_ids:
         return {}
 
-    prices = {}
-    missing_ids = []
-    batch_size = 100  # Reduced to avoid query too long errors
+    if cache is None:
+        cache = {}
 
-    # First pass: get prices for the exact date
-    for i in range(0, len(card_ids), batch_size):
-        batch_ids = card_ids[i:i + batch_size]
+    batch_size = 100  # Reduced to avoid query too long errors
 
-        response = client.from_("card_prices_daily") \
+    def fetch_batch(batch_ids: list) -> list:
+        return client.from_("card_prices_daily") \
             .select("card_id, nm_price, market_price") \
             .eq("price_date", price_date) \
             .in_("card_id", batch_ids) \
-            .execute()
-
-        found_ids = set()
-        for row in response.data:
-            price = row.get("nm_price") or row.get("market_price")
-            if price:
-                prices[row["card_id"]] = float(price)
-                found_ids.add(row["card_id"])
-
-        # Track missing cards for forward-fill
-        missing_ids.extend([cid for cid in batch_ids if cid not in found_ids])
-
-    # Second pass: forward-fill missing prices (use last known price)
-    # No time limit - the card will be rebalanced at the next monthly rebalancing
-    if use_forward_fill and missing_ids:
-        for card_id in missing_ids:
-            response = client.from_("card_prices_daily") \
-                .select("nm_price, market_price, price_date") \
-                .eq("card_id", card_id) \
-                .lt("price_date", price_date) \
-                .order("price_date", desc=True) \
-                .limit(1) \
-                .execute()
-
-            if response.data:
-                row = response.data[0]
+            .execute().data
+
+    def fetch_last_known(card_id: str) -> list:
+        return client.from_("card_prices_daily") \
+            .select("card_id, nm_price, market_price, price_date") \
+            .eq("card_id", card_id) \
+            .lt("price_date", price_date) \
+            .order("price_date", desc=True) \
+            .limit(1) \
+            .execute().data
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # First pass: get prices for the exact date
+        to_fetch = [cid for cid in card_ids if (cid, price_date) not in cache]
+        batches = [to_fetch[i:i + batch_size] for i in range(0, len(to_fetch), batch_size)]
+        for batch_ids, rows in zip(batches, executor.map(fetch_batch, batches)):
+            for cid in batch_ids:
+                cache[(cid, price_date)] = None
+            for row in rows:
                 price = row.get("nm_price") or row.get("market_price")
                 if price:
-                    prices[card_id] = float(price)
+                    cache[(row["card_id"], price_date)] = float(price)
+
+        prices = {cid: cache[(cid, price_date)] for cid in card_ids
+                  if cache[(cid, price_date)] is not None}
+
+        # Second pass: forward-fill missing prices (use last known price)
+        # No time limit - the card will be rebalanced at the next monthly rebalancing
+        missing_ids = [cid for cid in card_ids if cid not in prices]
+        if use_forward_fill and missing_ids:
+            to_fetch = [cid for cid in missing_ids if (cid, price_date, "last_known") not in cache]
+            for cid, rows in zip(to_fetch, executor.map(fetch_last_known, to_fetch)):
+                price = (rows[0].get("nm_price") or rows[0].get("market_price")) if rows else None
+                cache[(cid, price_date, "last_known")] = float(price) if price else None
+
+            for cid in missing_ids:
+                price = cache[(cid, price_date, "last_known")]
+                if price is not None:
+                    prices[cid] = price
 
     return prices
 
 
+def get_month_constituents(client, month: str, index_codes: list = None) -> dict:
+    """
+    Loads the stored constituents of the indexes for a month.
+
+    All indexes (INDEX_CODES unless index_codes is given) are fetched
+    together (paginated, Supabase 1000 row limit) and grouped by
+    index_code. Indexes without constituents are absent from the result.
+    """
+    rows_by_index = {}
+    offset = 0
+    page_size = 1000
+
+    while True:
+        response = client.from_("constituents_monthly") \
+            .select("index_code, item_id, weight, composite_price, liquidity_score, ranking_score, rank") \
+            .eq("month", month) \
+            .in_("index_code", index_codes or INDEX_CODES) \
+            .order("index_code") \
+            .order("rank") \
+            .range(offset, offset + page_size - 1) \
+            .execute()
+
+        if not response.data:
+            break
+
+        for row in response.data:
+            rows_by_index.setdefault(row["index_code"], []).append(row)
+
+        if len(response.data) < page_size:
+            break
+
+        offset += page_size
+
+    return rows_by_index
+
+
 # =============================================================================
 # FILTERING & SELECTION
 # =============================================================================
@@ -262,10 +275,11 @@ def filter_rare_cards(cards: list) -> list:
 
 def filter_outliers(cards: list) -> list:
     """Filter outliers according to defined rules."""
-    min_price = OUTLIER_RULES.get("min_price", 0.10)
-    max_price = OUTLIER_RULES.get("max_price", 100000)
+    min_price = OUTLIER_RULES["min_price"]
+    max_price = OUTLIER_RULES["max_price"]
 
-    return [c for c in cards if min_price <= c.get("price", 0) <= max_price]
+    # Every card from get_cards_with_prices() has a price
+    return [c for c in cards if min_price <= c["price"] <= max_price]
 
 
 def filter_immature_cards(cards: list, index_code: str, reference_date: str) -> list:
@@ -339,10 +353,20 @@ def select_constituents(cards: list, index_code: str, client=None, price_date: s
 
     No minimum liquidity threshold - the ranking_score naturally penalizes
     illiquid cards while allowing high-value cards with moderate liquidity.
+
+    The input cards are not modified; returned constituents are copies.
     """
     config = INDEX_CONFIG.get(index_code, {})
 
-    # Calculate/recalculate liquidity for each card (B + C method)
+    # Load 30-day volume history in batches (cached across indexes), so the
+    # liquidity and Method D loops below don't query once per card
+    if client and price_date:
+        prefetch_volume_history(client, [c["card_id"] for c in cards], price_date)
+
+    # Calculate/recalculate liquidity for each card (B + C method).
+    # Scores go on per-call copies: the same card dicts are passed for
+    # every index and must not carry one index's scores into another.
+    cards = [dict(card) for card in cards]
     for card in cards:
         if client and price_date:
             smart_score, method = calculate_liquidity_smart(
@@ -386,15 +410,15 @@ def select_constituents(cards: list, index_code: str, client=None, price_date: s
         # No client - use all cards (fallback for testing)
         eligible = cards
 
-    # Sort by ranking score descending
-    eligible.sort(key=lambda x: x.get("ranking_score", 0), reverse=True)
-
-    # Select top N
+    # Select top N by ranking score (descending); partial selection with
+    # heapq is equivalent to sort + slice, ties keep their input order.
+    # Every card got its ranking_score above.
+    ranking_key = itemgetter("ranking_score")
     size = config.get("size")
     if size:
-        return eligible[:size]
+        return heapq.nlargest(size, eligible, key=ranking_key)
     else:
-        return eligible
+        return sorted(eligible, key=ranking_key, reverse=True)
 
 
 def calculate_weights(constituents: list) -> list:
@@ -429,60 +453,100 @@ def calculate_weights(constituents: list) -> list:
 # LASPEYRES CHAIN-LINKING
 # =============================================================================
 
+def round_half_up(value: float, quantum: str) -> float:
+    """
+    Round a float half-up to the given quantum (e.g. "0.0001").
+
+    Used only when publishing values; all intermediate math stays in float.
+    """
+    return float(Decimal(str(value)).quantize(Decimal(quantum), rounding=ROUND_HALF_UP))
+
+
+def _previous_constituents(rows: list) -> list:
+    """Convert constituents_monthly rows to the {card_id, weight, price} form."""
+    return [{
+        "card_id": row["item_id"],
+        "weight": float(row["weight"]) if row["weight"] else 0,
+        "price": float(row["composite_price"]) if row["composite_price"] else 0,
+    } for row in rows]
+
+
 def get_previous_index_data(client, index_code: str) -> dict:
     """
     Get index data from the previous period.
+
+    Single-index form of prefetch_previous_index_data(), so every caller
+    chain-links over the same full (paginated) basket.
+
     Returns: {value, date, constituents: [{card_id, weight, price}]}
     """
-    # Last value
+    return prefetch_previous_index_data(client, [index_code])[index_code]
+
+
+def prefetch_previous_index_data(client, index_codes: list, month_rows_by_index: dict = None) -> dict:
+    """
+    Get the previous-period data of several indexes at once.
+
+    Same result as get_previous_index_data() for each index, with the full
+    basket (paginated) instead of its first 1000 rows. The last values
+    come from a single query (one more per index missing from it)
+    and the constituents from the month's rows already loaded by main
+    (previous month as a fallback, one paginated query).
+
+    Returns: {index_code: {value, date, constituents} or None}
+    """
+    # Last value of each index: indexes are calculated together, so the
+    # latest rows of a short window contain every index
     response = client.from_("index_values_daily") \
-        .select("index_value, value_date") \
-        .eq("index_code", index_code) \
+        .select("index_code, index_value, value_date") \
+        .in_("index_code", index_codes) \
         .order("value_date", desc=True) \
-        .limit(1) \
+        .limit(len(index_codes) * 7) \
         .execute()
-    
-    if not response.data:
-        return None
-    
-    prev_value = response.data[0]["index_value"]
-    prev_date = response.data[0]["value_date"]
-    
-    # Constituents for current month (or previous if beginning of month)
-    current_month = get_current_month()
-    
-    response = client.from_("constituents_monthly") \
-        .select("item_id, weight, composite_price") \
-        .eq("index_code", index_code) \
-        .eq("month", current_month) \
-        .execute()
-    
-    # If no constituents this month, try previous month
-    if not response.data:
-        prev_month = get_previous_month()
-        response = client.from_("constituents_monthly") \
-            .select("item_id, weight, composite_price") \
+
+    last_values = {}
+    for row in response.data:
+        last_values.setdefault(row["index_code"], row)
+
+    # Not in the window (stale index or first calculation): last value only
+    for index_code in index_codes:
+        if index_code in last_values:
+            continue
+        response = client.from_("index_values_daily") \
+            .select("index_value, value_date") \
             .eq("index_code", index_code) \
-            .eq("month", prev_month) \
+            .order("value_date", desc=True) \
+            .limit(1) \
             .execute()
-    
-    constituents = []
-    for row in response.data:
-        constituents.append({
-            "card_id": row["item_id"],
-            "weight": float(row["weight"]) if row["weight"] else 0,
-            "price": float(row["composite_price"]) if row["composite_price"] else 0,
-        })
-    
-    return {
-        "value": float(prev_value),
-        "date": prev_date,
-        "constituents": constituents,
-    }
+        if response.data:
+            last_values[index_code] = response.data[0]
+
+    if month_rows_by_index is None:
+        month_rows_by_index = get_month_constituents(client, get_current_month(), index_codes)
+
+    missing = [code for code in index_codes
+               if code in last_values and code not in month_rows_by_index]
+    prev_month_rows = get_month_constituents(client, get_previous_month(), missing) if missing else {}
+
+    result = {}
+    for index_code in index_codes:
+        if index_code not in last_values:
+            result[index_code] = None
+            continue
+
+        rows = month_rows_by_index.get(index_code) or prev_month_rows.get(index_code, [])
+        result[index_code] = {
+            "value": float(last_values[index_code]["index_value"]),
+            "date": last_values[index_code]["value_date"],
+            "constituents": _previous_constituents(rows),
+        }
+
+    return result
 
 
 def calculate_index_laspeyres(client, index_code: str, constituents: list,
-                               current_date: str) -> tuple:
+                               current_date: str, previous_index_data: dict = None,
+                               price_cache: dict = None) -> tuple:
     """
     Calculate index value using the Laspeyres chain-linking method.
 
@@ -496,10 +560,17 @@ def calculate_index_laspeyres(client, index_code: str, constituents: list,
 
     Uses forward-filling for missing prices (last known price, no time limit).
 
+    previous_index_data: optional result of prefetch_previous_index_data();
+    the previous data is queried when omitted.
+    price_cache: optional get_prices_for_date() cache shared across indexes.
+
     Returns: (index_value, details_dict)
     """
     # Get previous data
-    prev_data = get_previous_index_data(client, index_code)
+    if previous_index_data is not None:
+        prev_data = previous_index_data.get(index_code)
+    else:
+        prev_data = get_previous_index_data(client, index_code)
 
     # First calculation = base 100
     if prev_data is None or not prev_data.get("constituents"):
@@ -515,35 +586,39 @@ def calculate_index_laspeyres(client, index_code: str, constituents: list,
 
     # Get current prices for previous constituents (with forward-fill)
     card_ids = [c["card_id"] for c in prev_constituents]
-    current_prices = get_prices_for_date(client, card_ids, current_date, use_forward_fill=True)
+    if price_cache is None:
+        price_cache = {}
+    current_prices = get_prices_for_date(client, card_ids, current_date, use_forward_fill=True,
+                                         cache=price_cache)
 
     # IMPORTANT: Get PREVIOUS DAY prices (not rebalancing prices!)
     # This is the key fix - we need P_i,t-1 from the actual previous day
-    prev_day_prices = get_prices_for_date(client, card_ids, prev_date, use_forward_fill=True)
+    prev_day_prices = get_prices_for_date(client, card_ids, prev_date, use_forward_fill=True,
+                                          cache=price_cache)
 
-    # Also get exact-date prices to count forward-fills
-    exact_prices = get_prices_for_date(client, card_ids, current_date, use_forward_fill=False)
+    # Also get exact-date prices to count forward-fills (served from the cache)
+    exact_prices = get_prices_for_date(client, card_ids, current_date, use_forward_fill=False,
+                                       cache=price_cache)
     forward_filled_count = len(current_prices) - len(exact_prices)
 
-    # Calculate Laspeyres ratio using Decimal for precision
-    # This prevents floating-point accumulation errors over many calculations
-    numerator = Decimal('0')    # Σ(w_i × P_i,t)
-    denominator = Decimal('0')  # Σ(w_i × P_i,t-1)
-    matched_count = 0
+    # Laspeyres sums in float: math.fsum keeps each sum exactly rounded,
+    # so Decimal is only needed to round the published values
+    numerator_terms = []    # w_i × P_i,t
+    denominator_terms = []  # w_i × P_i,t-1
 
     for pc in prev_constituents:
         card_id = pc["card_id"]
-        weight = Decimal(str(pc["weight"]))
         # Use actual previous day price, not the rebalancing price!
         prev_price = prev_day_prices.get(card_id, 0)
 
         if card_id in current_prices and prev_price > 0:
-            current_price = Decimal(str(current_prices[card_id]))
-            prev_price_dec = Decimal(str(prev_price))
+            weight = pc["weight"]
+            numerator_terms.append(weight * current_prices[card_id])
+            denominator_terms.append(weight * prev_price)
 
-            numerator += weight * current_price
-            denominator += weight * prev_price_dec
-            matched_count += 1
+    numerator = math.fsum(numerator_terms)
+    denominator = math.fsum(denominator_terms)
+    matched_count = len(numerator_terms)
 
     # Verification: require at least 70% of constituents to have valid prices
     # This ensures the index is representative and reduces noise
@@ -552,28 +627,26 @@ def calculate_index_laspeyres(client, index_code: str, constituents: list,
         # Fallback: use average of available variations
         if matched_count > 0 and denominator > 0:
             ratio = numerator / denominator
-            new_value = Decimal(str(prev_value)) * ratio
-            return float(new_value.quantize(Decimal('0.0001'), rounding=ROUND_HALF_UP)), {
+            return round_half_up(prev_value * ratio, "0.0001"), {
                 "method": "laspeyres_partial",
                 "matched": matched_count,
                 "total": len(prev_constituents),
                 "forward_filled": forward_filled_count,
-                "ratio": float(ratio.quantize(Decimal('0.000001'), rounding=ROUND_HALF_UP)),
+                "ratio": round_half_up(ratio, "0.000001"),
             }
         else:
             return prev_value, {"method": "fallback", "reason": "no_price_match"}
 
-    # Laspeyres calculation with Decimal precision
+    # Laspeyres calculation
     ratio = numerator / denominator
-    new_value = Decimal(str(prev_value)) * ratio
 
-    return float(new_value.quantize(Decimal('0.0001'), rounding=ROUND_HALF_UP)), {
+    return round_half_up(prev_value * ratio, "0.0001"), {
         "method": "laspeyres",
         "matched": matched_count,
         "total": len(prev_constituents),
         "forward_filled": forward_filled_count,
-        "ratio": float(ratio.quantize(Decimal('0.000001'), rounding=ROUND_HALF_UP)),
-        "change_pct": float(((ratio - 1) * 100).quantize(Decimal('0.0001'), rounding=ROUND_HALF_UP)),
+        "ratio": round_half_up(ratio, "0.000001"),
+        "change_pct": round_half_up((ratio - 1) * 100, "0.0001"),
     }
 
 
@@ -581,16 +654,11 @@ def calculate_index_laspeyres(client, index_code: str, constituents: list,
 # PERSISTENCE
 # =============================================================================
 
-def save_constituents(client, index_code: str, month: str, constituents: list) -> int:
+def _constituent_rows(index_code: str, month: str, constituents: list) -> list:
     """
-    Save monthly constituents with transaction safety.
-    
-    Strategy: Insert first, then delete old entries only if insert succeeds.
-    This ensures we never lose data if the insert fails.
+    Build the constituents_monthly rows of a basket, as stored
+    (rank by position, rounded price/scores/weight).
     """
-    if not constituents:
-        return 0
-    
     rows = []
     for i, c in enumerate(constituents, 1):
         rows.append({
@@ -605,6 +673,20 @@ def save_constituents(client, index_code: str, month: str, constituents: list) -
             "weight": round(c.get("weight", 0), 8),
             "is_new": True,
         })
+    return rows
+
+
+def save_constituents(client, index_code: str, month: str, constituents: list) -> int:
+    """
+    Save monthly constituents with transaction safety.
+    
+    Strategy: Insert first, then delete old entries only if insert succeeds.
+    This ensures we never lose data if the insert fails.
+    """
+    if not constituents:
+        return 0
+    
+    rows = _constituent_rows(index_code, month, constituents)
     
     # Use upsert with on_conflict to atomically replace data
     result = batch_upsert(
@@ -631,12 +713,14 @@ def save_constituents(client, index_code: str, month: str, constituents: list) -
         ids_to_remove = existing_ids - set(current_item_ids)
         
         if ids_to_remove:
-            for item_id in ids_to_remove:
+            ids_to_remove = sorted(ids_to_remove)
+            batch_size = 100  # Keep the in_() filter URL short
+            for i in range(0, len(ids_to_remove), batch_size):
                 client.from_("constituents_monthly") \
                     .delete() \
                     .eq("index_code", index_code) \
                     .eq("month", month) \
-                    .eq("item_id", item_id) \
+                    .in_("item_id", ids_to_remove[i:i + batch_size]) \
                     .execute()
             print(f"   🗑️ Removed {len(ids_to_remove)} old constituents")
     except Exception as e:
@@ -645,68 +729,69 @@ def save_constituents(client, index_code: str, month: str, constituents: list) -
     return result["saved"]
 
 
-def save_index_value(client, index_code: str, value_date: str, index_value: float,
-                     n_constituents: int, market_cap: float, calc_details: dict) -> bool:
-    """Save index value to database."""
-    # Calculate changes
-    change_1d = None
-    change_1w = None
-    change_1m = None
-    
-    # 1 day ago
-    try:
-        day_ago = (date.fromisoformat(value_date) - timedelta(days=1)).strftime("%Y-%m-%d")
-        response = client.from_("index_values_daily") \
-            .select("index_value") \
-            .eq("index_code", index_code) \
-            .lte("value_date", day_ago) \
-            .order("value_date", desc=True) \
-            .limit(1) \
-            .execute()
+def _change_targets(value_date: str) -> dict:
+    """Target dates of the 1d/1w/1m changes of a value."""
+    value_day = date.fromisoformat(value_date)
+    return {
+        "1d": (value_day - timedelta(days=1)).strftime("%Y-%m-%d"),
+        "1w": (value_day - timedelta(days=7)).strftime("%Y-%m-%d"),
+        "1m": (value_day - timedelta(days=30)).strftime("%Y-%m-%d"),
+    }
 
-        if response.data:
-            prev_val = response.data[0]["index_value"]
-            if prev_val > 0:
-                change_1d = round((index_value - prev_val) / prev_val * 100, 4)
-    except Exception:
-        pass
-    
-    # 1 week ago
-    try:
-        week_ago = (date.fromisoformat(value_date) - timedelta(days=7)).strftime("%Y-%m-%d")
-        response = client.from_("index_values_daily") \
-            .select("index_value") \
-            .eq("index_code", index_code) \
-            .lte("value_date", week_ago) \
-            .order("value_date", desc=True) \
-            .limit(1) \
-            .execute()
 
-        if response.data:
-            prev_val = response.data[0]["index_value"]
-            if prev_val > 0:
-                change_1w = round((index_value - prev_val) / prev_val * 100, 4)
-    except Exception:
-        pass
+def get_index_history(client, index_codes: list, value_date: str) -> dict:
+    """
+    Get the values preceding value_date needed for the 1d/1w/1m changes.
+
+    One query for all indexes; the window reaches 30 days before the
+    1-month target so a recent value is found even after gaps.
+
+    Returns: {index_code: [{value_date, index_value}] newest first},
+    empty if the lookup fails (changes are then left empty).
+    """
+    targets = _change_targets(value_date)
+    window_start = (date.fromisoformat(value_date) - timedelta(days=60)).strftime("%Y-%m-%d")
 
-    # 1 month ago
+    history = {}
     try:
-        month_ago = (date.fromisoformat(value_date) - timedelta(days=30)).strftime("%Y-%m-%d")
         response = client.from_("index_values_daily") \
-            .select("index_value") \
-            .eq("index_code", index_code) \
-            .lte("value_date", month_ago) \
+            .select("index_code, value_date, index_value") \
+            .in_("index_code", index_codes) \
+            .lte("value_date", targets["1d"]) \
+            .gte("value_date", window_start) \
             .order("value_date", desc=True) \
-            .limit(1) \
             .execute()
 
-        if response.data:
-            prev_val = response.data[0]["index_value"]
-            if prev_val > 0:
-                change_1m = round((index_value - prev_val) / prev_val * 100, 4)
+        for row in response.data:
+            history.setdefault(row["index_code"], []).append(row)
     except Exception:
         pass
-    
+
+    return history
+
+
+def save_index_value(client, index_code: str, value_date: str, index_value: float,
+                     n_constituents: int, market_cap: float, calc_details: dict,
+                     history: list = None) -> bool:
+    """
+    Save index value to database.
+
+    history: this index's rows from get_index_history(); queried when omitted.
+    """
+    # Calculate changes: compare with the most recent value at or before
+    # each target date
+    if history is None:
+        history = get_index_history(client, [index_code], value_date).get(index_code, [])
+
+    targets = _change_targets(value_date)
+    changes = {period: None for period in targets}
+
+    for period, target in targets.items():
+        prev_val = next((row["index_value"] for row in history
+                         if row["value_date"] <= target), None)
+        if prev_val and prev_val > 0:
+            changes[period] = round((index_value - prev_val) / prev_val * 100, 4)
+
     try:
         client.from_("index_values_daily").upsert({
             "index_code": index_code,
@@ -714,9 +799,9 @@ def save_index_value(client, index_code: str, value_date: str, index_value: floa
             "index_value": round(index_value, 4),
             "n_constituents": n_constituents,
             "total_market_cap": round(market_cap, 2),
-            "change_1d": change_1d,
-            "change_1w": change_1w,
-            "change_1m": change_1m,
+            "change_1d": changes["1d"],
+            "change_1w": changes["1w"],
+            "change_1m": changes["1m"],
         }, on_conflict="index_code,value_date").execute()
         
         return True
@@ -757,8 +842,7 @@ def main():
         # Price date - always use J-2 to ensure complete volume data
         print_step(2, "Finding prices (J-2 for volume guarantee)")
         price_date = get_index_price_date(client)
-        latest_date = get_latest_price_date(client)
-        print_success(f"Index date: {price_date} (latest available: {latest_date})")
+        print_success(f"Index date: {price_date}")
         
         current_month = get_current_month()
         print(f"   Current month: {current_month}")
@@ -776,16 +860,13 @@ def main():
         # =======================================================================
 
         need_rebalance = args.rebalance
+        constituent_rows_by_index = {}
 
         if not need_rebalance:
-            # Check if constituents exist for this month
-            response = client.from_("constituents_monthly") \
-                .select("index_code", count="exact") \
-                .eq("month", current_month) \
-                .limit(1) \
-                .execute()
-
-            if response.count == 0:
+            # Load this month's constituents; none at all means no rebalance yet
+            constituent_rows_by_index = get_month_constituents(client, current_month)
+
+            if not constituent_rows_by_index:
                 # No constituents for this month yet
                 # Check if price_date is from current month (>= 1st of month)
                 first_of_month = current_month  # e.g., "2026-01-01"
@@ -799,6 +880,9 @@ def main():
         # Load cards with prices
         print_step(3, "Loading data")
         all_cards = get_cards_with_prices(client, price_date)
+        cards_by_id = {c["card_id"]: c for c in all_cards}
+        # Exact prices of the day, reused by every index's Laspeyres lookups
+        price_cache = {(c["card_id"], price_date): c["price"] for c in all_cards}
         print_success(f"{len(all_cards)} cards with NM prices")
         
         # Filter rare cards
@@ -813,12 +897,20 @@ def main():
             print_error("No eligible cards!")
             return
         
+        # Previous values and baskets of all indexes (chain-linking base)
+        previous_index_data = prefetch_previous_index_data(
+            client, INDEX_CODES, constituent_rows_by_index
+        )
+
+        # Values before price_date for the 1d/1w/1m changes of all indexes
+        index_history = get_index_history(client, INDEX_CODES, price_date)
+
         # Calculate each index
         print_step(4, "Calculating indexes")
         
         results = {}
         
-        for index_code in ["RARE_100", "RARE_500", "RARE_5000"]:
+        for index_code in INDEX_CODES:
             print(f"\n   {'='*50}")
             print(f"   📈 {index_code}")
             print(f"   {'='*50}")
@@ -828,7 +920,7 @@ def main():
                 print(f"   🔄 Rebalancing (smart liquidity B+C+D)...")
 
                 # Filter immature cards (sets released too recently)
-                mature_cards = filter_immature_cards(rare_cards.copy(), index_code, price_date)
+                mature_cards = filter_immature_cards(rare_cards, index_code, price_date)
 
                 # Select constituents with smart liquidity
                 constituents = select_constituents(
@@ -853,35 +945,19 @@ def main():
                 # Save
                 saved = save_constituents(client, index_code, current_month, constituents)
                 print(f"   ✅ {saved} constituents saved")
-            else:
-                # Load existing constituents with pagination (Supabase 1000 row limit)
-                all_constituent_rows = []
-                offset = 0
-                page_size = 1000
 
-                while True:
-                    response = client.from_("constituents_monthly") \
-                        .select("item_id, weight, composite_price, liquidity_score, ranking_score") \
-                        .eq("index_code", index_code) \
-                        .eq("month", current_month) \
-                        .order("rank") \
-                        .range(offset, offset + page_size - 1) \
-                        .execute()
-
-                    if not response.data:
-                        break
-
-                    all_constituent_rows.extend(response.data)
-
-                    if len(response.data) < page_size:
-                        break
-
-                    offset += page_size
+                if saved and previous_index_data.get(index_code):
+                    # Chain-link over the basket just saved, as stored
+                    previous_index_data[index_code]["constituents"] = _previous_constituents(
+                        _constituent_rows(index_code, current_month, constituents)
+                    )
+            else:
+                all_constituent_rows = constituent_rows_by_index.get(index_code, [])
 
                 constituents = []
                 for row in all_constituent_rows:
                     # Find card name
-                    card_info = next((c for c in all_cards if c["card_id"] == row["item_id"]), None)
+                    card_info = cards_by_id.get(row["item_id"])
                     constituents.append({
                         "card_id": row["item_id"],
                         "name": card_info["name"] if card_info else "Unknown",
@@ -898,7 +974,8 @@ def main():
             
             # Laspeyres calculation
             index_value, calc_details = calculate_index_laspeyres(
-                client, index_code, constituents, price_date
+                client, index_code, constituents, price_date, previous_index_data,
+                price_cache
             )
             
             # Market cap
@@ -926,7 +1003,8 @@ def main():
             
             # Save value
             save_index_value(client, index_code, price_date, index_value,
-                           len(constituents), market_cap, calc_details)
+                           len(constituents), market_cap, calc_details,
+                           index_history.get(index_code, []))
             
             results[index_code] = {
                 "value": index_value,
@@ -939,11 +1017,13 @@ def main():
         # Final verification
         print_step(5, "Verification")
         
+        # Last 3 days of the calculated indexes, printed columns only
         response = client.from_("index_values_daily") \
-            .select("*") \
+            .select("index_code, value_date, index_value, change_1d, n_constituents") \
+            .in_("index_code", INDEX_CODES) \
             .order("value_date", desc=True) \
             .order("index_code") \
-            .limit(9) \
+            .limit(len(INDEX_CODES) * 3) \
             .execute()
         
         print("\n   📊 Latest values:")
@@ -15,25 +15,19 @@ def main():
     print("1. DISTINCT DATES in card_prices_daily")
     print("=" * 60)
 
-    # Get dates by querying with different strategies
-    # Strategy: get one record per date by using a subquery approach
+    # Walk the price_date index newest first: each query seeks to the next
+    # older date (keyset on price_date), so 10 dates cost 10 one-row queries
     all_dates = set()
-
-    # Fetch in pages to get all unique dates
-    offset = 0
-    page_size = 1000
-    while True:
-        result = db.from_('card_prices_daily').select('price_date').order('price_date', desc=True).range(offset, offset + page_size - 1).execute()
+    last_date = None
+    while len(all_dates) < 10:
+        query = db.from_('card_prices_daily').select('price_date')
+        if last_date is not None:
+            query = query.lt('price_date', last_date)
+        result = query.order('price_date', desc=True).limit(1).execute()
         if not result.data:
             break
-        for r in result.data:
-            all_dates.add(r['price_date'])
-        if len(result.data) < page_size:
-            break
-        offset += page_size
-        # Stop after getting enough to find distinct dates
-        if len(all_dates) >= 10:
-            break
+        last_date = result.data[0]['price_date']
+        all_dates.add(last_date)
 
     dates = sorted(all_dates, reverse=True)[:10]
     print(f"  Found {len(all_dates)} distinct dates (showing last 10):")
@@ -57,14 +51,20 @@ def main():
     # Find the card
     card_result = db.from_('cards').select('card_id, name').ilike('name', '%Umbreon%ex%').limit(5).execute()
     if card_result.data:
+        # Get prices for all matched cards in one query (last 5 known dates)
+        card_ids = [card['card_id'] for card in card_result.data]
+        prices_result = db.from_('card_prices_daily').select('card_id, price_date, market_price, nm_price, daily_volume').in_('card_id', card_ids).in_('price_date', dates[:5]).order('price_date', desc=True).execute()
+        prices_by_card = {}
+        for p in prices_result.data:
+            prices_by_card.setdefault(p['card_id'], []).append(p)
+
         for card in card_result.data:
             print(f"  Found: {card['card_id']} - {card['name']}")
 
-            # Get prices for this card
-            prices = db.from_('card_prices_daily').select('*').eq('card_id', card['card_id']).order('price_date', desc=True).limit(5).execute()
-            if prices.data:
+            card_prices = prices_by_card.get(card['card_id'])
+            if card_prices:
                 print(f"  Prices:")
-                for p in prices.data:
+                for p in card_prices:
                     print(f"    {p['price_date']}: market=${p.get('market_price', 'N/A')}, nm=${p.get('nm_price', 'N/A')}, volume={p.get('daily_volume', 'N/A')}")
             else:
                 print("  No prices found!")
@@ -76,9 +76,11 @@ def main():
     print("3. PRICE CHANGES between last 2 dates")
     print("=" * 60)
 
-    # Get prices for both dates
-    latest_prices = db.from_('card_prices_daily').select('card_id, market_price').eq('price_date', latest_date).limit(100).execute()
-    prev_prices = db.from_('card_prices_daily').select('card_id, market_price').eq('price_date', previous_date).limit(100).execute()
+    # Get a sample of priced cards for the latest date, then the same cards
+    # for the previous date (two independent samples would barely overlap)
+    latest_prices = db.from_('card_prices_daily').select('card_id, market_price').eq('price_date', latest_date).not_.is_('market_price', 'null').limit(100).execute()
+    sample_ids = [p['card_id'] for p in latest_prices.data]
+    prev_prices = db.from_('card_prices_daily').select('card_id, market_price').eq('price_date', previous_date).in_('card_id', sample_ids).execute()
 
     latest_map = {p['card_id']: float(p['market_price'] or 0) for p in latest_prices.data}
     prev_map = {p['card_id']: float(p['market_price'] or 0) for p in prev_prices.data}
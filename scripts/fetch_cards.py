@@ -15,14 +15,13 @@ Usage:
 
 import sys
 import os
-import time
-import requests
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
 # Local imports
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from scripts.utils import (
-    get_db_client, batch_upsert,
+    get_db_client, batch_upsert, create_http_session,
     log_run_start, log_run_end, send_discord_notification, get_today,
     print_header, print_step, print_success, print_error
 )
@@ -31,6 +30,9 @@ from config.settings import RARE_RARITIES
 # TCGdex API Base URL
 TCGDEX_URL = "https://api.tcgdex.net/v2/en"
 
+# Shared session: keeps the HTTPS connection to TCGdex open across sets
+SESSION = create_http_session()
+
 
 def fetch_sets() -> list:
     """
@@ -40,7 +42,7 @@ def fetch_sets() -> list:
         list: List of sets with {id, name, releaseDate, ...}
     """
     url = f"{TCGDEX_URL}/sets"
-    response = requests.get(url, timeout=30)
+    response = SESSION.get(url, timeout=30)
     response.raise_for_status()
     return response.json()
 
@@ -56,7 +58,7 @@ def fetch_cards_for_set(set_id: str) -> list:
         list: List of cards
     """
     url = f"{TCGDEX_URL}/sets/{set_id}"
-    response = requests.get(url, timeout=30)
+    response = SESSION.get(url, timeout=30)
     response.raise_for_status()
     data = response.json()
     return data.get("cards", [])
@@ -135,11 +137,9 @@ def main():
         
         # Transform and save sets
         print_step(3, "Saving sets")
-        sets_to_save = []
-        for s in sets:
-            transformed = transform_set(s)
-            if transformed.get("set_id"):
-                sets_to_save.append(transformed)
+        # Sets without an id are skipped here and when fetching cards
+        sets_with_id = [s for s in sets if s.get("id")]
+        sets_to_save = [transform_set(s) for s in sets_with_id]
         
         result = batch_upsert(client, "sets", sets_to_save, on_conflict="set_id")
         print_success(f"{result['saved']} sets saved")
@@ -149,41 +149,48 @@ def main():
         print_step(4, "Fetching cards by set")
         
         all_cards = []
-        
-        for i, set_data in enumerate(sets, 1):
-            set_id = set_data.get("id")
-            set_name = set_data.get("name")
-            release_date = set_data.get("releaseDate")
-            
-            if not set_id:
-                continue
-            
-            print(f"\n   [{i}/{len(sets)}] 📦 {set_name} ({set_id})")
-            
+
+        def fetch_set(set_data: dict):
+            """Fetch one set's cards; errors are returned to be reported in order."""
             try:
-                cards = fetch_cards_for_set(set_id)
-                
-                for card in cards:
-                    transformed = transform_card(card, set_id, set_name, release_date)
-                    if transformed.get("card_id"):
-                        all_cards.append(transformed)
-                        if transformed.get("is_eligible"):
-                            eligible_cards += 1
-                
-                print(f"   ✅ {len(cards)} cards")
-                
+                return fetch_cards_for_set(set_data["id"]), None
             except Exception as e:
-                print(f"   ⚠️ Error: {e}")
-            
-            # Save in batches of 2000
-            if len(all_cards) >= 2000:
-                result = batch_upsert(client, "cards", all_cards, on_conflict="card_id")
-                print(f"\n   💾 Batch saved: {result['saved']} cards")
-                total_cards += result['saved']
-                all_cards = []
-            
-            # Small pause to be nice to the API
-            time.sleep(0.1)
+                return None, e
+
+        # Sets are independent: fetch them concurrently on the shared session,
+        # while results are transformed and saved in set order on this thread
+        executor = ThreadPoolExecutor(max_workers=8)
+        try:
+            results = executor.map(fetch_set, sets_with_id)
+
+            for i, (set_data, (cards, error)) in enumerate(zip(sets_with_id, results), 1):
+                set_id = set_data["id"]
+                set_name = set_data.get("name")
+                release_date = set_data.get("releaseDate")
+
+                print(f"\n   [{i}/{len(sets_with_id)}] 📦 {set_name} ({set_id})")
+
+                if error is not None:
+                    print(f"   ⚠️ Error: {error}")
+                else:
+                    for card in cards:
+                        transformed = transform_card(card, set_id, set_name, release_date)
+                        if transformed.get("card_id"):
+                            all_cards.append(transformed)
+                            if transformed.get("is_eligible"):
+                                eligible_cards += 1
+
+                    print(f"   ✅ {len(cards)} cards")
+
+                # Save in batches of 2000
+                if len(all_cards) >= 2000:
+                    result = batch_upsert(client, "cards", all_cards, on_conflict="card_id")
+                    print(f"\n   💾 Batch saved: {result['saved']} cards")
+                    total_cards += result['saved']
+                    all_cards = []
+        finally:
+            # Drop queued sets if the loop stops early (error or Ctrl+C)
+            executor.shutdown(cancel_futures=True)
         
         # Save remaining cards
         if all_cards:
@@ -194,24 +201,27 @@ def main():
         # Verification
         print_step(5, "Verification")
         
-        response = client.from_("sets").select("*", count="exact").execute()
+        response = client.from_("sets").select("*", count="exact", head=True).execute()
         print(f"   Sets in database: {response.count}")
         
-        response = client.from_("cards").select("*", count="exact").execute()
+        response = client.from_("cards").select("*", count="exact", head=True).execute()
         print(f"   Cards in database: {response.count}")
         
-        response = client.from_("cards").select("*", count="exact").eq("is_eligible", True).execute()
+        response = client.from_("cards").select("*", count="exact", head=True).eq("is_eligible", True).execute()
         print(f"   Eligible cards (>= Rare): {response.count}")
         
         # Rarity distribution
         print("\n   📊 Rarity distribution (Top 10):")
-        response = client.from_("cards").select("rarity").execute()
-        rarity_counts = {}
+        # Counted server-side (sql/create_v_rarity_counts.sql)
+        response = client.from_("v_rarity_counts") \
+            .select("rarity, card_count") \
+            .order("card_count", desc=True) \
+            .limit(10) \
+            .execute()
+        
         for row in response.data:
             rarity = row.get("rarity") or "(Empty)"
-            rarity_counts[rarity] = rarity_counts.get(rarity, 0) + 1
-        
-        for rarity, count in sorted(rarity_counts.items(), key=lambda x: -x[1])[:10]:
+            count = row["card_count"]
             eligible_marker = "✓" if rarity in RARE_RARITIES else "✗"
             print(f"      {eligible_marker} {rarity:<30} : {count:>5}")
         
@@ -15,18 +15,20 @@ Usage:
 
 import sys
 import os
-import requests
 from datetime import datetime, date, timedelta
 
 # Local imports
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from scripts.utils import (
-    get_db_client,
+    get_db_client, batch_upsert, create_http_session,
     log_run_start, log_run_end, send_discord_notification, get_today,
     print_header, print_step, print_success, print_error
 )
 from config.settings import FRANKFURTER_URL
 
+# Shared session: one HTTPS connection for the latest + historical calls
+SESSION = create_http_session(pool_maxsize=1)
+
 
 def fetch_latest_rate() -> dict:
     """
@@ -38,7 +40,7 @@ def fetch_latest_rate() -> dict:
     url = f"{FRANKFURTER_URL}/latest"
     params = {"from": "EUR", "to": "USD"}
     
-    response = requests.get(url, params=params, timeout=30)
+    response = SESSION.get(url, params=params, timeout=30)
     response.raise_for_status()
     data = response.json()
     
@@ -62,18 +64,15 @@ def fetch_historical_rates(start_date: str, end_date: str) -> list:
     url = f"{FRANKFURTER_URL}/{start_date}..{end_date}"
     params = {"from": "EUR", "to": "USD"}
     
-    response = requests.get(url, params=params, timeout=30)
+    response = SESSION.get(url, params=params, timeout=30)
     response.raise_for_status()
     data = response.json()
     
-    rates = []
-    for rate_date, rate_data in data.get("rates", {}).items():
-        rates.append({
-            "date": rate_date,
-            "rate": rate_data.get("USD"),
-        })
-    
-    return sorted(rates, key=lambda x: x["date"])
+    # ISO dates sort chronologically as strings
+    return [
+        {"date": rate_date, "rate": rate_data.get("USD")}
+        for rate_date, rate_data in sorted(data.get("rates", {}).items())
+    ]
 
 
 def main():
@@ -99,13 +98,8 @@ def main():
     run_id = log_run_start(client, "fetch_fx_rates")
     
     try:
-        # Fetch latest rate
-        print_step(2, "Fetching latest EUR/USD rate")
-        latest = fetch_latest_rate()
-        print_success(f"EUR/USD = {latest['rate']:.4f} ({latest['date']})")
-        
         # Check last rate in database
-        print_step(3, "Checking database")
+        print_step(2, "Checking database")
         response = client.from_("fx_rates_daily") \
             .select("rate_date") \
             .order("rate_date", desc=True) \
@@ -113,6 +107,7 @@ def main():
             .execute()
         
         rates_to_save = []
+        start = None
         
         if response.data:
             last_date = response.data[0]["rate_date"]
@@ -122,27 +117,18 @@ def main():
             last = date.fromisoformat(last_date)
 
             if last < today_date - timedelta(days=1):
-                # Fetch missing days
                 start = (last + timedelta(days=1)).strftime("%Y-%m-%d")
-                end = today_str
-                
-                print(f"   Fetching missing rates: {start} to {end}")
-                historical = fetch_historical_rates(start, end)
-                
-                for rate in historical:
-                    rates_to_save.append({
-                        "rate_date": rate["date"],
-                        "eurusd": rate["rate"],
-                    })
-                
-                print_success(f"{len(historical)} missing rates fetched")
+                print(f"   Missing rates: {start} to {today_str}")
         else:
             # First run - fetch last 30 days
             print("   Empty database, fetching last 30 days")
             start = (today_date - timedelta(days=30)).strftime("%Y-%m-%d")
-            end = today_str
-            
-            historical = fetch_historical_rates(start, end)
+        
+        # Fetch rates: the range call already ends with the latest rate,
+        # so /latest is only needed when no range is fetched (or it is empty)
+        print_step(3, "Fetching EUR/USD rates")
+        if start:
+            historical = fetch_historical_rates(start, today_str)
             
             for rate in historical:
                 rates_to_save.append({
@@ -152,32 +138,31 @@ def main():
             
             print_success(f"{len(historical)} rates fetched")
         
-        # Always add latest rate
-        rates_to_save.append({
-            "rate_date": latest["date"],
-            "eurusd": latest["rate"],
-        })
+        if rates_to_save:
+            latest = {"date": rates_to_save[-1]["rate_date"], "rate": rates_to_save[-1]["eurusd"]}
+        else:
+            latest = fetch_latest_rate()
+            rates_to_save.append({
+                "rate_date": latest["date"],
+                "eurusd": latest["rate"],
+            })
+        print_success(f"EUR/USD = {latest['rate']:.4f} ({latest['date']})")
         
         # Save to database
         print_step(4, "Saving rates")
         
-        saved = 0
-        for rate in rates_to_save:
-            try:
-                client.from_("fx_rates_daily").upsert(
-                    rate, on_conflict="rate_date"
-                ).execute()
-                saved += 1
-            except Exception as e:
-                print(f"   ⚠️ Error saving {rate['rate_date']}: {e}")
+        result = batch_upsert(client, "fx_rates_daily", rates_to_save, on_conflict="rate_date")
+        saved = result["saved"]
         
+        if result["failed"]:
+            print(f"   ⚠️ {result['failed']} rates could not be saved")
         print_success(f"{saved} rates saved")
         
         # Verification
         print_step(5, "Verification")
         
         response = client.from_("fx_rates_daily") \
-            .select("*") \
+            .select("rate_date, eurusd") \
             .order("rate_date", desc=True) \
             .limit(5) \
             .execute()
@@ -20,6 +20,7 @@ import sys
 import os
 import time
 import requests
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, date
 
 # Local imports
@@ -27,9 +28,12 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from scripts.utils import (
     get_db_client, batch_upsert, fetch_all_paginated,
     log_run_start, log_run_end, send_discord_notification, get_today,
-    print_header, print_step, print_success, print_error
+    print_header, print_step, print_success, print_error,
+    weighted_by_condition, create_http_session, MAX_RETRY_WAIT
+)
+from config.settings import (
+    PPT_API_KEY, PPT_RATE_LIMIT, CONDITION_WEIGHTS, CONDITION_ORDER, LIQUIDITY_CAP, VOLUME_CAP, RARE_RARITIES
 )
-from config.settings import PPT_API_KEY, CONDITION_WEIGHTS, LIQUIDITY_CAP, VOLUME_CAP, RARE_RARITIES
 
 # API Base URL (v2)
 BASE_URL = "https://www.pokemonpricetracker.com/api/v2"
@@ -39,6 +43,28 @@ HEADERS = {
     "Authorization": f"Bearer {PPT_API_KEY}",
 }
 
+# API condition name -> column prefix in card_prices_daily
+CONDITION_FIELDS = tuple(zip(CONDITION_ORDER, ("nm", "lp", "mp", "hp", "dmg")))
+
+# Shared session: keeps the TLS connection alive across all set fetches.
+# No adapter-level retries, api_request handles 429 / credit exhaustion itself.
+SESSION = create_http_session(retries=0)
+SESSION.headers.update(HEADERS)
+
+# Pacing: at most PPT_RATE_LIMIT["requests_per_minute"] requests per minute.
+# Measured from the start of the previous request, so slow responses
+# leave no extra idle time.
+MIN_REQUEST_INTERVAL = 60 / PPT_RATE_LIMIT["requests_per_minute"]
+_last_request_at = 0.0
+
+
+def wait_for_request_slot():
+    """Sleeps until MIN_REQUEST_INTERVAL has passed since the last request."""
+    global _last_request_at
+    wait = _last_request_at + MIN_REQUEST_INTERVAL - time.monotonic()
+    if wait > 0:
+        time.sleep(wait)
+    _last_request_at = time.monotonic()
 
 
 def api_request(endpoint: str, params: dict = None, max_retries: int = 5) -> tuple:
@@ -52,7 +78,8 @@ def api_request(endpoint: str, params: dict = None, max_retries: int = 5) -> tup
 
     for attempt in range(max_retries):
         try:
-            response = requests.get(url, headers=HEADERS, params=params, timeout=60)
+            wait_for_request_slot()
+            response = SESSION.get(url, params=params, timeout=60)
 
             # Extract credits from headers
             credits_remaining = int(response.headers.get("X-Ratelimit-Daily-Remaining", -1))
@@ -62,7 +89,9 @@ def api_request(endpoint: str, params: dict = None, max_retries: int = 5) -> tup
                 if credits_remaining == 0:
                     print(f"   ❌ API credits exhausted!")
                     return None, 0
-                wait_time = 10 * (attempt + 1)  # 10s, 20s, 30s, 40s, 50s
+                # Honour the server's Retry-After (capped), else back off 10s, 20s, 30s...
+                retry_after = response.headers.get("Retry-After", "")
+                wait_time = min(int(retry_after), MAX_RETRY_WAIT) if retry_after.isdigit() else 10 * (attempt + 1)
                 print(f"   ⏳ Rate limit, waiting {wait_time}s... (attempt {attempt + 1}/{max_retries})")
                 time.sleep(wait_time)
                 continue
@@ -100,9 +129,8 @@ def check_api_credits() -> int:
         int: Credits remaining, or -1 if unable to check
     """
     try:
-        response = requests.get(
+        response = SESSION.get(
             f"{BASE_URL}/cards",
-            headers=HEADERS,
             params={"set": "Base Set", "limit": 1},
             timeout=30
         )
@@ -188,85 +216,58 @@ def extract_price_data(card_data: dict, price_date: str) -> dict:
     if not market_price:
         return None
     
-    # Price by condition (current data)
-    nm_data = conditions.get("Near Mint", {}) if conditions else {}
-    lp_data = conditions.get("Lightly Played", {}) if conditions else {}
-    mp_data = conditions.get("Moderately Played", {}) if conditions else {}
-    hp_data = conditions.get("Heavily Played", {}) if conditions else {}
-    dmg_data = conditions.get("Damaged", {}) if conditions else {}
-    
     # Total listings (raw, unweighted)
-    total_listings = 0
-    for cond_data in conditions.values():
-        if isinstance(cond_data, dict):
-            total_listings += cond_data.get("listings", 0) or 0
+    total_listings = sum(
+        cond_data.get("listings", 0) or 0
+        for cond_data in conditions.values()
+        if isinstance(cond_data, dict)
+    )
     
     # Fallback to global listings if no conditions
     if total_listings == 0:
         total_listings = prices.get("listings", 0) or 0
     
-    # =========================================================================
-    # Extract sales volume from priceHistory for the target date (J-2)
-    # =========================================================================
-    nm_volume = None
-    lp_volume = None
-    mp_volume = None
-    hp_volume = None
-    dmg_volume = None
-    nm_price_hist = None  # Price from history for target date
-    lp_price_hist = None
-    mp_price_hist = None
-    hp_price_hist = None
-    dmg_price_hist = None
-
     price_history = card_data.get("priceHistory", {})
+    conditions_history = {}
     if price_history and isinstance(price_history, dict):
-        conditions_history = price_history.get("conditions", {})
+        conditions_history = price_history.get("conditions") or {}
 
-        # For each condition, find the entry matching price_date
-        for cond_name, cond_history in conditions_history.items():
-            if not isinstance(cond_history, dict):
-                continue
-
-            history_list = cond_history.get("history", [])
-            if history_list:
-                # Find entry matching the target date
-                for entry in history_list:
-                    if not isinstance(entry, dict):
-                        continue
-                    entry_date = entry.get("date", "")[:10]  # Extract YYYY-MM-DD
-                    if entry_date == price_date:
-                        vol = entry.get("volume")
-                        price_hist = entry.get("market")
-                        # Assign to correct field
-                        if cond_name == "Near Mint":
-                            nm_volume = vol
-                            nm_price_hist = price_hist
-                        elif cond_name == "Lightly Played":
-                            lp_volume = vol
-                            lp_price_hist = price_hist
-                        elif cond_name == "Moderately Played":
-                            mp_volume = vol
-                            mp_price_hist = price_hist
-                        elif cond_name == "Heavily Played":
-                            hp_volume = vol
-                            hp_price_hist = price_hist
-                        elif cond_name == "Damaged":
-                            dmg_volume = vol
-                            dmg_price_hist = price_hist
-                        break  # Found the target date, move to next condition
+    # =========================================================================
+    # Per-condition prices, listings and sales volume for the target date (J-2)
+    # =========================================================================
+    # Historical price (from target date) when available, fallback to current:
+    # this ensures we get the actual price on the target date, not today's price
+    condition_columns = {}
+    volumes = {}
+    nm_price_hist = None
+
+    for cond_name, prefix in CONDITION_FIELDS:
+        cond_data = conditions.get(cond_name) if conditions else None
+        if not isinstance(cond_data, dict):
+            cond_data = {}
+
+        # Find the history entry matching the target date
+        volume = None
+        price_hist = None
+        cond_history = conditions_history.get(cond_name)
+        if isinstance(cond_history, dict):
+            for entry in cond_history.get("history", []) or []:
+                if isinstance(entry, dict) and entry.get("date", "")[:10] == price_date:
+                    volume = entry.get("volume")
+                    price_hist = entry.get("market")
+                    break
+
+        if prefix == "nm":
+            nm_price_hist = price_hist
+        condition_columns[f"{prefix}_price"] = price_hist if price_hist is not None else cond_data.get("price")
+        condition_columns[f"{prefix}_listings"] = cond_data.get("listings")
+        volumes[f"{prefix}_volume"] = volume
     
     # =========================================================================
     # Liquidity calculation - Based on weighted volume
     # =========================================================================
     # Calculate weighted volume (condition-adjusted)
-    weighted_volume = (
-        (nm_volume or 0) * CONDITION_WEIGHTS.get("Near Mint", 1.0) +
-        (lp_volume or 0) * CONDITION_WEIGHTS.get("Lightly Played", 0.8) +
-        (mp_volume or 0) * CONDITION_WEIGHTS.get("Moderately Played", 0.6) +
-        (hp_volume or 0) * CONDITION_WEIGHTS.get("Heavily Played", 0.4) +
-        (dmg_volume or 0) * CONDITION_WEIGHTS.get("Damaged", 0.2)
-    )
+    weighted_volume = weighted_by_condition(*volumes.values())
     
     # daily_volume = weighted volume (Option B)
     daily_volume = weighted_volume if weighted_volume > 0 else None
@@ -281,14 +282,6 @@ def extract_price_data(card_data: dict, price_date: str) -> dict:
     # Last updated
     last_updated = prices.get("lastUpdated")
 
-    # Use historical prices (from target date) when available, fallback to current
-    # This ensures we get the actual price on the target date, not today's price
-    final_nm_price = nm_price_hist if nm_price_hist is not None else (nm_data.get("price") if isinstance(nm_data, dict) else None)
-    final_lp_price = lp_price_hist if lp_price_hist is not None else (lp_data.get("price") if isinstance(lp_data, dict) else None)
-    final_mp_price = mp_price_hist if mp_price_hist is not None else (mp_data.get("price") if isinstance(mp_data, dict) else None)
-    final_hp_price = hp_price_hist if hp_price_hist is not None else (hp_data.get("price") if isinstance(hp_data, dict) else None)
-    final_dmg_price = dmg_price_hist if dmg_price_hist is not None else (dmg_data.get("price") if isinstance(dmg_data, dict) else None)
-
     # Market price: use NM historical price if available
     final_market_price = nm_price_hist if nm_price_hist is not None else market_price
 
@@ -299,23 +292,10 @@ def extract_price_data(card_data: dict, price_date: str) -> dict:
         "low_price": prices.get("low"),
         "mid_price": prices.get("mid"),
         "high_price": prices.get("high"),
-        "nm_price": final_nm_price,
-        "nm_listings": nm_data.get("listings") if isinstance(nm_data, dict) else None,
-        "lp_price": final_lp_price,
-        "lp_listings": lp_data.get("listings") if isinstance(lp_data, dict) else None,
-        "mp_price": final_mp_price,
-        "mp_listings": mp_data.get("listings") if isinstance(mp_data, dict) else None,
-        "hp_price": final_hp_price,
-        "hp_listings": hp_data.get("listings") if isinstance(hp_data, dict) else None,
-        "dmg_price": final_dmg_price,
-        "dmg_listings": dmg_data.get("listings") if isinstance(dmg_data, dict) else None,
+        **condition_columns,
         "total_listings": total_listings,
         "daily_volume": daily_volume,  # Weighted volume
-        "nm_volume": nm_volume,
-        "lp_volume": lp_volume,
-        "mp_volume": mp_volume,
-        "hp_volume": hp_volume,
-        "dmg_volume": dmg_volume,
+        **volumes,
         "liquidity_score": round(liquidity_score, 4),
         "last_updated_api": last_updated,
     }
@@ -391,6 +371,23 @@ def fetch_prices_for_set(set_name: str, price_date: str, filter_rarity: bool = T
         return [], {"total": 0, "filtered": 0, "skipped": 0, "with_volume": 0}, -1
 
 
+def finish_pending_save(pending) -> int:
+    """
+    Waits for a background batch save to complete.
+
+    Args:
+        pending: Future returned by submitting batch_upsert, or None
+
+    Returns:
+        int: Number of prices saved
+    """
+    if pending is None:
+        return 0
+    result = pending.result()
+    print(f"\n   💾 Batch saved: {result['saved']} prices")
+    return result['saved']
+
+
 def main():
     from datetime import date, timedelta
 
@@ -450,6 +447,11 @@ def main():
     credits_exhausted = False
     last_credits = initial_credits
 
+    # Batches are saved in the background while the next sets are fetched.
+    # One worker: at most one save in flight, batches written in order.
+    save_pool = ThreadPoolExecutor(max_workers=1)
+    pending_save = None
+
     try:
         # Get list of sets from database
         print_step(3, "Loading sets from Supabase")
@@ -485,6 +487,8 @@ def main():
                 credits_exhausted = True
 
                 # Save any pending prices before stopping
+                total_prices += finish_pending_save(pending_save)
+                pending_save = None
                 if all_prices:
                     result = batch_upsert(client, "card_prices_daily", all_prices,
                                           on_conflict="price_date,card_id")
@@ -514,18 +518,16 @@ def main():
             for rarity, count in stats.get("skipped_rarities", {}).items():
                 skipped_by_rarity[rarity] = skipped_by_rarity.get(rarity, 0) + count
 
-            # Save in batches of 2000
+            # Save in batches of 2000 (in the background)
             if len(all_prices) >= 2000:
-                result = batch_upsert(client, "card_prices_daily", all_prices,
-                                      on_conflict="price_date,card_id")
-                print(f"\n   💾 Batch saved: {result['saved']} prices")
-                total_prices += result['saved']
+                total_prices += finish_pending_save(pending_save)
+                pending_save = save_pool.submit(batch_upsert, client, "card_prices_daily", all_prices,
+                                                on_conflict="price_date,card_id")
                 all_prices = []
-
-            # Pause for rate limit
-            time.sleep(0.5)
         
         # Last batch
+        total_prices += finish_pending_save(pending_save)
+        pending_save = None
         if all_prices:
             result = batch_upsert(client, "card_prices_daily", all_prices,
                                   on_conflict="price_date,card_id")
@@ -551,11 +553,14 @@ def main():
             .execute()
         
         if response.data:
+            # Card names for all 5 rows in one query
+            card_ids = [row["card_id"] for row in response.data]
+            card_resp = client.from_("cards").select("card_id, name").in_("card_id", card_ids).execute()
+            names = {c["card_id"]: c["name"] for c in card_resp.data}
+
             print("\n   📈 Top 5 by sales volume:")
             for row in response.data:
-                # Get card name
-                card_resp = client.from_("cards").select("name").eq("card_id", row["card_id"]).execute()
-                name = card_resp.data[0]["name"][:25] if card_resp.data else row["card_id"][:25]
+                name = names.get(row["card_id"], row["card_id"])[:25]
                 market_price = row.get('market_price') or 0
                 daily_volume = row.get('daily_volume') or 0
                 liquidity_score = row.get('liquidity_score') or 0
@@ -630,6 +635,10 @@ def main():
         )
         raise
 
+    finally:
+        save_pool.shutdown(wait=True)
+        SESSION.close()
+
 
 if __name__ == "__main__":
     main()
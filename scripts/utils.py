@@ -9,8 +9,10 @@ from __future__ import annotations
 import os
 import sys
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from datetime import datetime, date, timedelta, timezone
-from typing import Optional, Any
+from typing import Any, Callable, Optional
 from postgrest import SyncPostgrestClient
 from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
 
@@ -24,6 +26,7 @@ from config.settings import (
     PPT_BASE_URL,
     DISCORD_WEBHOOK_URL,
     CONDITION_WEIGHTS,
+    CONDITION_ORDER,
     VOLUME_DECAY_WEIGHTS,
     VOLUME_DECAY_SUM,
     VOLUME_CAP,
@@ -61,6 +64,55 @@ def get_db_client() -> SyncPostgrestClient:
     )
 
 
+# ============================================================
+# HTTP Session
+# ============================================================
+
+# Longest single wait between retries (backoff or Retry-After), in seconds
+MAX_RETRY_WAIT = 60
+
+
+class _CappedRetry(Retry):
+    """Retry that never waits longer than MAX_RETRY_WAIT on a Retry-After header."""
+
+    def parse_retry_after(self, retry_after: str) -> float:
+        return min(super().parse_retry_after(retry_after), MAX_RETRY_WAIT)
+
+
+def create_http_session(pool_maxsize: int = 16, retries: int = 3) -> requests.Session:
+    """
+    Creates a requests session for an external API.
+
+    The session keeps HTTPS connections alive between calls and retries
+    rate limits (429) and server errors with exponential backoff,
+    honouring Retry-After (each wait capped at MAX_RETRY_WAIT).
+
+    Args:
+        pool_maxsize: Connections kept open per host
+        retries: Retry attempts per request (0 leaves retries to the caller)
+
+    Returns:
+        requests.Session: Session to use instead of requests.get
+    """
+    max_retries = _CappedRetry(
+        total=retries,
+        backoff_factor=2,
+        backoff_max=MAX_RETRY_WAIT,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=["GET"],
+        respect_retry_after_header=True,
+    ) if retries else 0
+    adapter = HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=pool_maxsize,
+        max_retries=max_retries,
+    )
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
 # ============================================================
 # PokemonPriceTracker API Client
 # ============================================================
@@ -142,6 +194,41 @@ def fetch_all_paginated(client: SyncPostgrestClient, table: str, select: str = "
     return all_rows
 
 
+def fetch_all_keyset(make_query: Callable[[], Any], key: str,
+                     page_size: int = 1000) -> list[dict[str, Any]]:
+    """
+    Fetches all rows of a query with keyset (cursor) pagination.
+
+    Each page is ordered by `key` and starts after the last key seen, so
+    the database seeks on the index instead of skipping OFFSET rows.
+
+    Args:
+        make_query: Returns a fresh filtered query (select + filters)
+        key: Unique column to paginate on (e.g. "card_id")
+        page_size: Page size (Supabase limits to 1000)
+
+    Returns:
+        list: All rows, ordered by key
+    """
+    all_rows = []
+    last_key = None
+
+    while True:
+        query = make_query()
+        if last_key is not None:
+            query = query.gt(key, last_key)
+
+        response = query.order(key).limit(page_size).execute()
+        all_rows.extend(response.data)
+
+        if len(response.data) < page_size:
+            break
+
+        last_key = response.data[-1][key]
+
+    return all_rows
+
+
 # ============================================================
 # Batch Insert Helper
 # ============================================================
@@ -338,6 +425,105 @@ def print_progress(current: int, total: int, prefix: str = ""):
 # Liquidity Calculation (Smart 50/30/20 + Method D)
 # ============================================================
 
+# Condition weights resolved once, in CONDITION_ORDER (nm, lp, mp, hp, dmg)
+_W_NM, _W_LP, _W_MP, _W_HP, _W_DMG = (CONDITION_WEIGHTS[c] for c in CONDITION_ORDER)
+
+
+def weighted_by_condition(nm: Optional[float], lp: Optional[float], mp: Optional[float],
+                          hp: Optional[float], dmg: Optional[float]) -> float:
+    """
+    Condition-weighted total of per-condition counts (listings or volume).
+
+    None counts as 0.
+    """
+    return (
+        (nm or 0) * _W_NM +
+        (lp or 0) * _W_LP +
+        (mp or 0) * _W_MP +
+        (hp or 0) * _W_HP +
+        (dmg or 0) * _W_DMG
+    )
+
+
+# 30-day weighted volume history per card: [(price_date, weighted_volume)],
+# keyed by (card_id, current_date). Filled by prefetch_volume_history so
+# liquidity and Method D calculations don't query once per card.
+_volume_history_cache: dict[tuple[str, str], list[tuple[str, float]]] = {}
+
+
+def _weighted_volume(row: dict[str, Any]) -> float:
+    """Condition-weighted volume of a card_prices_daily row."""
+    return weighted_by_condition(
+        row.get("nm_volume"), row.get("lp_volume"), row.get("mp_volume"),
+        row.get("hp_volume"), row.get("dmg_volume"),
+    )
+
+
+def prefetch_volume_history(client: SyncPostgrestClient, card_ids: list[str], current_date: str,
+                            days: int = 30, batch_size: int = 100,
+                            page_size: int = 1000) -> int:
+    """
+    Loads the weighted volume history of many cards with batched queries.
+
+    Covers the window used by get_volume_stats_30d, which also contains
+    the 7 days used by calculate_liquidity_smart, so both are then served
+    from memory. Cards already loaded are skipped. On error the remaining
+    cards fall back to per-card queries.
+
+    Args:
+        client: Supabase client
+        card_ids: Card IDs to load
+        current_date: End date (YYYY-MM-DD)
+        days: Lookback window in days
+        batch_size: Card IDs per in_() filter
+        page_size: Rows per page (Supabase limits to 1000)
+
+    Returns:
+        int: Number of cards loaded
+    """
+    missing = [cid for cid in dict.fromkeys(card_ids)
+               if (cid, current_date) not in _volume_history_cache]
+    if not missing:
+        return 0
+
+    start_date = (date.fromisoformat(current_date) - timedelta(days=days)).strftime("%Y-%m-%d")
+    loaded = 0
+
+    try:
+        for i in range(0, len(missing), batch_size):
+            batch_ids = missing[i:i + batch_size]
+            history: dict[str, list[tuple[str, float]]] = {cid: [] for cid in batch_ids}
+            offset = 0
+
+            while True:
+                response = client.from_("card_prices_daily") \
+                    .select("card_id, price_date, nm_volume, lp_volume, mp_volume, hp_volume, dmg_volume") \
+                    .in_("card_id", batch_ids) \
+                    .gte("price_date", start_date) \
+                    .lte("price_date", current_date) \
+                    .order("card_id") \
+                    .order("price_date") \
+                    .range(offset, offset + page_size - 1) \
+                    .execute()
+
+                for row in response.data:
+                    history[row["card_id"]].append((row["price_date"], _weighted_volume(row)))
+
+                if len(response.data) < page_size:
+                    break
+
+                offset += page_size
+
+            for cid, rows in history.items():
+                _volume_history_cache[(cid, current_date)] = rows
+            loaded += len(batch_ids)
+
+    except Exception:
+        pass  # Remaining cards are queried one by one
+
+    return loaded
+
+
 def calculate_liquidity_smart(client: SyncPostgrestClient, card_id: str, current_date: str,
                                nm_listings: int = 0, lp_listings: int = 0,
                                mp_listings: int = 0, hp_listings: int = 0,
@@ -351,6 +537,9 @@ def calculate_liquidity_smart(client: SyncPostgrestClient, card_id: str, current
     - Listings Score = min(weighted_listings / LIQUIDITY_CAP, 1.0)
     - Consistency Score = days_with_volume / days_in_period
 
+    Uses the prefetched volume history when available (see
+    prefetch_volume_history), otherwise queries the last 7 days.
+
     Args:
         client: Supabase client
         card_id: Card ID
@@ -367,12 +556,8 @@ def calculate_liquidity_smart(client: SyncPostgrestClient, card_id: str, current
     W_CONS = LIQUIDITY_WEIGHTS.get("consistency", 0.20)
 
     # Calculate listings score (always available)
-    weighted_listings = (
-        (nm_listings or 0) * CONDITION_WEIGHTS.get("Near Mint", 1.0) +
-        (lp_listings or 0) * CONDITION_WEIGHTS.get("Lightly Played", 0.8) +
-        (mp_listings or 0) * CONDITION_WEIGHTS.get("Moderately Played", 0.6) +
-        (hp_listings or 0) * CONDITION_WEIGHTS.get("Heavily Played", 0.4) +
-        (dmg_listings or 0) * CONDITION_WEIGHTS.get("Damaged", 0.2)
+    weighted_listings = weighted_by_condition(
+        nm_listings, lp_listings, mp_listings, hp_listings, dmg_listings
     )
     listings_score = min(weighted_listings / LIQUIDITY_CAP, 1.0)
 
@@ -381,41 +566,25 @@ def calculate_liquidity_smart(client: SyncPostgrestClient, card_id: str, current
         current = datetime.strptime(current_date, "%Y-%m-%d").date()
         dates = [(current - timedelta(days=i)).strftime("%Y-%m-%d") for i in range(7)]
 
-        response = client.from_("card_prices_daily") \
-            .select("price_date, nm_volume, lp_volume, mp_volume, hp_volume, dmg_volume") \
-            .eq("card_id", card_id) \
-            .in_("price_date", dates) \
-            .execute()
-
-        if response.data and len(response.data) >= 1:
-            # Calculate weighted volume for each date
-            total_weighted_volume = 0
-            days_with_volume = 0
-            days_in_period = len(response.data)
-
-            for row in response.data:
-                nm = row.get("nm_volume") or 0
-                lp = row.get("lp_volume") or 0
-                mp = row.get("mp_volume") or 0
-                hp = row.get("hp_volume") or 0
-                dmg = row.get("dmg_volume") or 0
-
-                weighted = (
-                    nm * CONDITION_WEIGHTS.get("Near Mint", 1.0) +
-                    lp * CONDITION_WEIGHTS.get("Lightly Played", 0.8) +
-                    mp * CONDITION_WEIGHTS.get("Moderately Played", 0.6) +
-                    hp * CONDITION_WEIGHTS.get("Heavily Played", 0.4) +
-                    dmg * CONDITION_WEIGHTS.get("Damaged", 0.2)
-                )
-
-                total_weighted_volume += weighted
-                if weighted > 0:
-                    days_with_volume += 1
-
+        history = _volume_history_cache.get((card_id, current_date))
+        if history is not None:
+            last_7_days = set(dates)
+            weighted_volumes = [w for d, w in history if d in last_7_days]
+        else:
+            response = client.from_("card_prices_daily") \
+                .select("price_date, nm_volume, lp_volume, mp_volume, hp_volume, dmg_volume") \
+                .eq("card_id", card_id) \
+                .in_("price_date", dates) \
+                .execute()
+            weighted_volumes = [_weighted_volume(row) for row in response.data]
+
+        if weighted_volumes:
             # Calculate scores
-            avg_daily_volume = total_weighted_volume / days_in_period if days_in_period > 0 else 0
+            days_in_period = len(weighted_volumes)
+            days_with_volume = sum(1 for w in weighted_volumes if w > 0)
+            avg_daily_volume = sum(weighted_volumes) / days_in_period
             volume_score = min(avg_daily_volume / VOLUME_CAP, 1.0)
-            consistency_score = days_with_volume / days_in_period if days_in_period > 0 else 0
+            consistency_score = days_with_volume / days_in_period
 
             # Combined score: 50% volume + 30% listings + 20% consistency
             final_score = W_VOL * volume_score + W_LIST * listings_score + W_CONS * consistency_score
@@ -431,6 +600,29 @@ def calculate_liquidity_smart(client: SyncPostgrestClient, card_id: str, current
     return round(final_score, 4), "listings_only"
 
 
+def _volume_stats(weighted_volumes: list[float], min_days: int, avg_divisor: int) -> dict[str, Any]:
+    """Computes Method D volume stats from per-day weighted volumes."""
+    if not weighted_volumes:
+        return {
+            'avg_volume': 0.0,
+            'total_volume': 0.0,
+            'days_with_volume': 0,
+            'is_liquid': False,
+        }
+
+    traded = [w for w in weighted_volumes if w > 0]
+    days_with_volume = len(traded)
+    total_volume = sum(traded) if traded else 0
+
+    return {
+        'avg_volume': total_volume / avg_divisor,
+        'total_volume': total_volume,
+        'days_with_volume': days_with_volume,
+        # Card is liquid if it has enough data points with actual trading
+        'is_liquid': days_with_volume >= min_days,
+    }
+
+
 def get_volume_stats_30d(client: SyncPostgrestClient, card_id: str, current_date: str,
                          lookback_start: Optional[str] = None, min_days: Optional[int] = None,
                          avg_divisor: Optional[int] = None) -> dict[str, Any]:
@@ -440,6 +632,9 @@ def get_volume_stats_30d(client: SyncPostgrestClient, card_id: str, current_date
     IMPORTANT: Recalculates weighted volume from individual condition volumes
     to ensure consistency (daily_volume in DB may be inconsistent).
 
+    The default 30-day window is served from the volume history cache
+    when available (see prefetch_volume_history) and cached otherwise.
+
     Args:
         client: Supabase client
         card_id: Card ID
@@ -464,6 +659,11 @@ def get_volume_stats_30d(client: SyncPostgrestClient, card_id: str, current_date
     MIN_DAYS_WITH_VOLUME = min_days if min_days is not None else 10
     AVG_DIVISOR = avg_divisor if avg_divisor is not None else 30
 
+    cache_key = (card_id, current_date)
+    if lookback_start is None and cache_key in _volume_history_cache:
+        weighted_volumes = [w for _, w in _volume_history_cache[cache_key]]
+        return _volume_stats(weighted_volumes, MIN_DAYS_WITH_VOLUME, AVG_DIVISOR)
+
     try:
         current = datetime.strptime(current_date, "%Y-%m-%d").date()
 
@@ -474,61 +674,21 @@ def get_volume_stats_30d(client: SyncPostgrestClient, card_id: str, current_date
 
         # Fetch individual condition volumes to recalculate weighted volume
         response = client.from_("card_prices_daily") \
-            .select("nm_volume, lp_volume, mp_volume, hp_volume, dmg_volume") \
+            .select("price_date, nm_volume, lp_volume, mp_volume, hp_volume, dmg_volume") \
             .eq("card_id", card_id) \
             .gte("price_date", start_date) \
             .lte("price_date", current_date) \
             .execute()
 
-        if response.data:
-            weighted_volumes = []
-            for row in response.data:
-                # Recalculate weighted volume for consistency
-                nm = row.get("nm_volume") or 0
-                lp = row.get("lp_volume") or 0
-                mp = row.get("mp_volume") or 0
-                hp = row.get("hp_volume") or 0
-                dmg = row.get("dmg_volume") or 0
-
-                weighted = (
-                    nm * CONDITION_WEIGHTS.get("Near Mint", 1.0) +
-                    lp * CONDITION_WEIGHTS.get("Lightly Played", 0.8) +
-                    mp * CONDITION_WEIGHTS.get("Moderately Played", 0.6) +
-                    hp * CONDITION_WEIGHTS.get("Heavily Played", 0.4) +
-                    dmg * CONDITION_WEIGHTS.get("Damaged", 0.2)
-                )
-
-                if weighted > 0:
-                    weighted_volumes.append(weighted)
-
-            days_with_volume = len(weighted_volumes)
-            total_volume = sum(weighted_volumes) if weighted_volumes else 0
-            avg_volume = total_volume / AVG_DIVISOR
-
-            # Card is liquid if it has enough data points with actual trading
-            is_liquid = days_with_volume >= MIN_DAYS_WITH_VOLUME
-
-            return {
-                'avg_volume': avg_volume,
-                'total_volume': total_volume,
-                'days_with_volume': days_with_volume,
-                'is_liquid': is_liquid,
-            }
-
-        return {
-            'avg_volume': 0.0,
-            'total_volume': 0.0,
-            'days_with_volume': 0,
-            'is_liquid': False,
-        }
+        history = [(row["price_date"], _weighted_volume(row)) for row in response.data]
 
     except Exception:
-        return {
-            'avg_volume': 0.0,
-            'total_volume': 0.0,
-            'days_with_volume': 0,
-            'is_liquid': False,
-        }
+        return _volume_stats([], MIN_DAYS_WITH_VOLUME, AVG_DIVISOR)
+
+    if lookback_start is None:
+        _volume_history_cache[cache_key] = history
+
+    return _volume_stats([w for _, w in history], MIN_DAYS_WITH_VOLUME, AVG_DIVISOR)
 
 
 def get_avg_volume_30d(client: SyncPostgrestClient, card_id: str, current_date: str) -> float:
@@ -0,0 +1,39 @@
+-- ============================================================
+-- View: v_cards_with_prices
+-- ============================================================
+-- Eligible cards joined with their daily prices, with the set's
+-- release date as fallback for cards without one. Used by
+-- calculate_index.py to load one day of prices in a single
+-- paginated query instead of merging cards and prices in Python.
+--
+-- Run this in Supabase SQL Editor before deploying the code changes.
+-- ============================================================
+
+CREATE OR REPLACE VIEW v_cards_with_prices AS
+SELECT
+    c.card_id,
+    c.name,
+    c.set_id,
+    c.rarity,
+    COALESCE(c.release_date, s.release_date) AS release_date,
+    p.price_date,
+    p.market_price,
+    p.nm_price,
+    p.nm_listings,
+    p.lp_listings,
+    p.mp_listings,
+    p.hp_listings,
+    p.dmg_listings,
+    p.total_listings,
+    p.daily_volume,
+    p.liquidity_score
+FROM cards c
+JOIN card_prices_daily p ON p.card_id = c.card_id
+LEFT JOIN sets s ON s.set_id = c.set_id
+WHERE c.is_eligible = true;
+
+-- Verify: one day of rows
+SELECT price_date, COUNT(*) AS cards
+FROM v_cards_with_prices
+WHERE price_date = (SELECT MAX(price_date) FROM card_prices_daily)
+GROUP BY price_date;
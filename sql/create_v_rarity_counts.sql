@@ -0,0 +1,18 @@
+-- ============================================================
+-- View: v_rarity_counts
+-- ============================================================
+-- Number of cards per rarity. Used by fetch_cards.py to print
+-- the rarity distribution without downloading every card row.
+--
+-- Run this in Supabase SQL Editor before deploying the code changes.
+-- ============================================================
+
+CREATE OR REPLACE VIEW v_rarity_counts AS
+SELECT
+    rarity,
+    COUNT(*) AS card_count
+FROM cards
+GROUP BY rarity;
+
+-- Verify
+SELECT * FROM v_rarity_counts ORDER BY card_count DESC;
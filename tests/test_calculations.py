@@ -11,10 +11,14 @@ import os
 # Add project root to path
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from config import settings
 from config.settings import (
     CONDITION_WEIGHTS, LIQUIDITY_CAP, VOLUME_CAP,
     LIQUIDITY_WEIGHTS, MIN_AVG_VOLUME_30D
 )
+from scripts.calculate_index import round_half_up, save_index_value, select_constituents
+from scripts.fetch_prices import extract_price_data
+from scripts.utils import weighted_by_condition
 
 
 # =============================================================================
@@ -123,6 +127,28 @@ class TestLaspeyresFormula:
         assert result == 120.0
 
 
+# =============================================================================
+# TEST: Publish Rounding
+# =============================================================================
+
+class TestRoundHalfUp:
+    """Tests for the half-up rounding applied to published values."""
+
+    def test_rounds_half_up(self):
+        """Ties should round away from zero, not to even."""
+        assert round_half_up(100.00005, "0.0001") == 100.0001
+        assert round_half_up(2.5, "1") == 3.0
+
+    def test_uses_shortest_repr(self):
+        """Binary float noise should not leak into the rounded value."""
+        # 1.00015 is stored as 1.000149999..., but publishes as 1.0002
+        assert round_half_up(1.00015, "0.0001") == 1.0002
+
+    def test_negative_values(self):
+        """Negative changes should round symmetrically."""
+        assert round_half_up(-2.34565, "0.0001") == -2.3457
+
+
 # =============================================================================
 # TEST: Weight Calculation
 # =============================================================================
@@ -330,6 +356,47 @@ class TestRankingScore:
         assert result == 0
 
 
+# =============================================================================
+# TEST: Constituent Selection
+# =============================================================================
+
+class TestSelectConstituents:
+    """Tests for top-N selection by ranking_score (no DB client)."""
+
+    def make_cards(self, n: int) -> list:
+        return [
+            {"card_id": f"card-{i:03}", "price": float(i % 7 + 1), "liquidity_score": 0.5}
+            for i in range(n)
+        ]
+
+    def test_top_n_matches_full_sort(self):
+        """Selected cards should equal the head of a full stable sort."""
+        cards = self.make_cards(250)
+
+        result = select_constituents(cards, "RARE_100")
+
+        expected = sorted(cards, key=lambda c: c["price"] * c["liquidity_score"], reverse=True)[:100]
+        assert [c["card_id"] for c in result] == [c["card_id"] for c in expected]
+
+    def test_fewer_cards_than_size(self):
+        """All cards are kept, highest ranking first, when below index size."""
+        cards = self.make_cards(5)
+
+        result = select_constituents(cards, "RARE_100")
+
+        assert len(result) == 5
+        assert result[0]["ranking_score"] == max(c["ranking_score"] for c in result)
+
+    def test_input_cards_not_modified(self):
+        """Scores and weights of one index must not leak into shared cards."""
+        cards = self.make_cards(5)
+
+        result = select_constituents(cards, "RARE_100")
+        result[0]["weight"] = 1.0
+
+        assert all("ranking_score" not in c and "weight" not in c for c in cards)
+
+
 # =============================================================================
 # TEST: Method D Filter
 # =============================================================================
@@ -421,6 +488,185 @@ class TestConditionWeights:
         result = self.calculate_weighted_listings(50, 0, 0, 0, 0)
         assert result == 50.0
 
+    def test_shared_helper_matches(self):
+        """weighted_by_condition should match the CONDITION_WEIGHTS formula."""
+        assert weighted_by_condition(10, 10, 10, 10, 10) == self.calculate_weighted_listings(10, 10, 10, 10, 10)
+        assert weighted_by_condition(3, 7, 0, 2, 1) == self.calculate_weighted_listings(3, 7, 0, 2, 1)
+
+    def test_shared_helper_treats_none_as_zero(self):
+        """Missing condition counts (None) should count as zero."""
+        assert weighted_by_condition(5, None, None, None, None) == 5.0
+
+
+# =============================================================================
+# TEST: Configuration Checks
+# =============================================================================
+
+class TestConfigErrors:
+    """Tests for the type/invariant checks run by validate_config()."""
+
+    def test_shipped_config_is_valid(self):
+        """The committed settings should pass all checks."""
+        assert settings.get_config_errors() == []
+
+    def test_string_size_reported_with_path(self, monkeypatch):
+        """A string index size should be reported with its field path."""
+        bad = {**settings.INDEX_CONFIG, "RARE_100": {**settings.INDEX_CONFIG["RARE_100"], "size": "100"}}
+        monkeypatch.setattr(settings, "INDEX_CONFIG", bad)
+
+        errors = settings.get_config_errors()
+
+        assert len(errors) == 1
+        assert errors[0].startswith("INDEX_CONFIG.RARE_100.size")
+
+    def test_liquidity_weights_must_sum_to_one(self, monkeypatch):
+        """Liquidity weights not summing to 1.0 should be reported."""
+        monkeypatch.setattr(settings, "LIQUIDITY_WEIGHTS", {"volume": 0.5, "listings": 0.3, "consistency": 0.3})
+
+        assert any(e.startswith("LIQUIDITY_WEIGHTS") for e in settings.get_config_errors())
+
+
+# =============================================================================
+# TEST: Price Extraction
+# =============================================================================
+
+PRICE_DATE = "2026-01-05"
+
+
+def make_api_card(conditions: dict, history: dict = None) -> dict:
+    """Build a PokemonPriceTracker card payload."""
+    card = {
+        "id": "card-001",
+        "prices": {"market": 10.0, "low": 8.0, "mid": 10.0, "high": 12.0,
+                   "lastUpdated": "2026-01-06T08:00:00Z", "conditions": conditions},
+    }
+    if history is not None:
+        card["priceHistory"] = {"conditions": {
+            cond: {"history": entries} for cond, entries in history.items()
+        }}
+    return card
+
+
+class TestExtractPriceData:
+    """Tests for the card_prices_daily row built from an API card."""
+
+    @pytest.mark.parametrize("history, expected", [
+        # No history: current condition prices, global market price
+        (None,
+         {"market_price": 10.0, "nm_price": 9.5, "lp_price": 7.0, "mp_price": None}),
+        # Target-date history overrides the current price (and market for NM)
+        ({"Near Mint": [{"date": f"{PRICE_DATE}T00:00:00Z", "market": 9.0, "volume": 2}]},
+         {"market_price": 9.0, "nm_price": 9.0, "lp_price": 7.0, "mp_price": None}),
+        # History for another date is ignored
+        ({"Near Mint": [{"date": "2026-01-04T00:00:00Z", "market": 8.0, "volume": 1}]},
+         {"market_price": 10.0, "nm_price": 9.5, "lp_price": 7.0, "mp_price": None}),
+        # History price without a current condition entry
+        ({"Moderately Played": [{"date": f"{PRICE_DATE}T00:00:00Z", "market": 5.0}]},
+         {"market_price": 10.0, "nm_price": 9.5, "lp_price": 7.0, "mp_price": 5.0}),
+    ])
+    def test_condition_prices(self, history, expected):
+        """Target-date history prices are used when present, current prices otherwise."""
+        card = make_api_card({
+            "Near Mint": {"price": 9.5, "listings": 4},
+            "Lightly Played": {"price": 7.0, "listings": 2},
+        }, history)
+
+        row = extract_price_data(card, PRICE_DATE)
+
+        assert {key: row[key] for key in expected} == expected
+
+    @pytest.mark.parametrize("conditions, history, expected", [
+        # Listings per condition, summed raw; no volume
+        ({"Near Mint": {"price": 9.5, "listings": 4}, "Damaged": {"price": 2.0, "listings": 1}},
+         None,
+         {"nm_listings": 4, "lp_listings": None, "dmg_listings": 1, "total_listings": 5,
+          "nm_volume": None, "dmg_volume": None, "daily_volume": None}),
+        # Volumes from target-date history, daily_volume condition-weighted
+        ({"Near Mint": {"price": 9.5, "listings": 4}},
+         {"Near Mint": [{"date": f"{PRICE_DATE}T00:00:00Z", "market": 9.0, "volume": 3}],
+          "Lightly Played": [{"date": f"{PRICE_DATE}T00:00:00Z", "market": 7.0, "volume": 5}]},
+         {"nm_listings": 4, "total_listings": 4, "nm_volume": 3, "lp_volume": 5, "hp_volume": None,
+          "daily_volume": weighted_by_condition(3, 5, None, None, None)}),
+        # No condition listings: falls back to the global listings count
+        ({}, None, {"nm_listings": None, "total_listings": 0}),
+    ])
+    def test_listings_and_volumes(self, conditions, history, expected):
+        """Listings and volumes land in the matching condition columns."""
+        row = extract_price_data(make_api_card(conditions, history), PRICE_DATE)
+
+        assert {key: row[key] for key in expected} == expected
+
+    def test_output_key_order(self):
+        """Rows keep the card_prices_daily column order."""
+        row = extract_price_data(make_api_card({"Near Mint": {"price": 9.5, "listings": 4}}), PRICE_DATE)
+
+        assert list(row) == [
+            "price_date", "card_id", "market_price", "low_price", "mid_price", "high_price",
+            "nm_price", "nm_listings", "lp_price", "lp_listings", "mp_price", "mp_listings",
+            "hp_price", "hp_listings", "dmg_price", "dmg_listings",
+            "total_listings", "daily_volume",
+            "nm_volume", "lp_volume", "mp_volume", "hp_volume", "dmg_volume",
+            "liquidity_score", "last_updated_api",
+        ]
+
+
+# =============================================================================
+# TEST: Index Changes
+# =============================================================================
+
+class RecordingClient:
+    """Minimal client recording upserted rows (no DB)."""
+
+    def __init__(self):
+        self.rows = []
+
+    def from_(self, table):
+        return self
+
+    def upsert(self, row, on_conflict=None):
+        self.rows.append(row)
+        return self
+
+    def execute(self):
+        return None
+
+
+class TestIndexChanges:
+    """Tests for the 1d/1w/1m changes computed from prefetched history."""
+
+    # get_index_history() result: rows before the value date, newest first
+    HISTORY = {
+        "RARE_100": [
+            {"value_date": "2026-03-30", "index_value": 100.0},
+            {"value_date": "2026-03-25", "index_value": 95.0},
+            {"value_date": "2026-03-22", "index_value": 88.0},   # 1w target 03-24 falls in a gap
+            {"value_date": "2026-03-01", "index_value": 125.0},  # 1m target
+            {"value_date": "2026-02-20", "index_value": 150.0},
+        ],
+    }
+
+    def save(self, index_value: float, history: list) -> dict:
+        client = RecordingClient()
+        assert save_index_value(client, "RARE_100", "2026-03-31", index_value,
+                                100, 1000.0, {}, history=history)
+        return client.rows[0]
+
+    def test_changes_from_history(self):
+        """Each change uses the latest value at or before its target date."""
+        row = self.save(110.0, self.HISTORY["RARE_100"])
+
+        assert row["change_1d"] == 10.0
+        assert row["change_1w"] == 25.0
+        assert row["change_1m"] == -12.0
+
+    def test_missing_history_leaves_changes_empty(self):
+        """Without earlier values (or with a zero value) changes stay None."""
+        row = self.save(110.0, self.HISTORY.get("RARE_500", []))
+        assert (row["change_1d"], row["change_1w"], row["change_1m"]) == (None, None, None)
+
+        row = self.save(110.0, [{"value_date": "2026-03-30", "index_value": 0}])
+        assert row["change_1d"] is None
+
 
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])